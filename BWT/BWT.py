@@ -8,7 +8,11 @@ Documentação e type hiting gerada por Ricardo Oliveira
 """
 
 
-import subprocess; import re
+from itertools import accumulate
+from operator import ne
+
+_BLOCO = 64
+_PREFIXO = 8
 
 def imprimir_matriz(matriz : list[str]) -> None:
     """
@@ -27,6 +31,75 @@ def imprimir_matriz(matriz : list[str]) -> None:
     for linha in matriz: print(linha)
 
 
+def _fm_search(pattern : bytes, lf_amostrado : list[list[int]], bwt_codigos : bytes) -> tuple[int, int]:
+    """
+    Backward search of a pattern over the FM-index tables of a BWT.
+    The pattern is read from the last to the first character, narrowing the interval [top, bottom] of
+    rows of the sorted rotation matrix that start with the suffix of the pattern read so far.
+    All characters are small integer codes, so the tables are indexed without any dictionary lookup.
+    The LF mapping C[c] + rank(c, i) is the sampled value at the start of the block of i plus the occurrences of c
+    between the start of the block and i, counted by bytes.count on at most _BLOCO codes.
+
+    Parameters:
+    -------------
+    pattern (bytes): 
+        The codes of the characters of the pattern to be searched.
+
+    lf_amostrado (list[list[int]]): 
+        The sampled LF table of the BWT, where lf_amostrado[c][k] is C[c] (the number of characters smaller than c)
+        plus the number of occurrences of code c in bwt[:k*_BLOCO].
+
+    bwt_codigos (bytes): 
+        The BWT with each character replaced by its code.
+
+    Returns:
+    ---------
+    tuple[int, int]:
+        The interval (top, bottom) of matching rows. If the pattern does not occur, top is greater than bottom.
+    """
+
+    top = 0
+    fim = len(bwt_codigos)
+    for symbol in reversed(pattern):
+        checkpoints = lf_amostrado[symbol]
+        bloco, resto = divmod(top, _BLOCO)
+        top = checkpoints[bloco] + bwt_codigos.count(symbol, top - resto, top)
+        bloco, resto = divmod(fim, _BLOCO)
+        fim = checkpoints[bloco] + bwt_codigos.count(symbol, fim - resto, fim)
+        if top >= fim: break
+
+    bottom = fim - 1
+
+    return top, bottom
+
+
+def _ranks(suffix_array : list[int], chaves : list) -> list[int]:
+    """
+    Computes the dense rank of each index of a sorted suffix array, given the keys it was sorted by.
+    The rank is the running count of key changes along the sorted order, computed with map/accumulate.
+
+    Parameters:
+    -------------
+    suffix_array (list[int]): 
+        The indices sorted by their keys.
+
+    chaves (list): 
+        The key of each index.
+
+    Returns:
+    ---------
+    list[int]:
+        The rank of each index; equal keys share the same rank.
+    """
+
+    ordenadas = list(map(chaves.__getitem__, suffix_array))
+    rank = [0] * len(suffix_array)
+    for i, r in zip(suffix_array, accumulate(map(ne, ordenadas, ordenadas[1:]), initial=0)):
+        rank[i] = r
+
+    return rank
+
+
 class BWT:
 
     """
@@ -45,21 +118,65 @@ class BWT:
     """
     def __init__(self, seq_original : str, encoded = False) -> None:
 
-        self.seq_original = seq_original
-        self.matrix_ord = self.matriz_ordenada()
-        if encoded: self.bwt = seq_original
-        else: self.bwt = self.construir_BWT()
-        self.listaSequenciaOriginal = []
         self.encoded = encoded
-        
+        self.seq_original = seq_original
+
+
+    @property
+    def seq_original(self) -> str:
+        """
+        The original sequence (or the BWT, for encoded instances), terminated with the end-of-string marker '$'.
+        """
+
+        return self._seq_original
+
+
+    @seq_original.setter
+    def seq_original(self, seq_original : str) -> None:
+        """
+        Sets the original sequence, appending '$' if it is missing, and recomputes the suffix array and the BWT.
+        The BWT is read from the suffix array, which is only valid when '$' occurs once, as the last character,
+        so a sequence with '$' anywhere else is rejected (encoded instances hold a BWT, where '$' can be anywhere).
+        The alphabet is packed into one byte per symbol (see _codificar), so at most 256 distinct characters are accepted.
+        The cached FM-index tables used by procuraPadraoBWT are discarded, so they are rebuilt on the next search.
+
+        Parameters:
+        -------------
+        seq_original (str): 
+            The original sequence, or the BWT itself if the instance is encoded.
+
+        Raises:
+        ---------
+        AssertionError:
+            If the input sequence is not a string, if it is not encoded and has a '$' that is not its last character,
+            or if it has more than 256 distinct characters.
+        """
+
+        assert isinstance(seq_original,str),"The input sequence must be a string"
+        assert self.encoded or '$' not in seq_original[:-1],"The end-of-string marker '$' can only be the last character"
+
+        if seq_original.find('$') == -1: self._seq_original = seq_original + '$'
+        else: self._seq_original = seq_original
+
+        assert len(set(self._seq_original)) <= 256,"The sequence can have at most 256 distinct characters, including '$'"
+
+        self._indice = None
+        if self.encoded:
+            self.bwt = seq_original
+            self.sa = None
+        else:
+            self.sa = self.suffix_array(self._seq_original)
+            self.bwt = self.construir_BWT()
+
 
     def matriz_ordenada(self) -> list[str]:
         """
         Generates a sorted matrix of the rotations of the original sequence.
-        The function first checks if the original sequence already contains the end-of-string marker '$'.
-        If not, it appends '$' to the sequence. Then, it creates a matrix by cycling the original sequence.
-        Each row in the matrix represents a rotation of the original sequence.
-        The matrix is then sorted in lexicographical order.
+        The setter of seq_original guarantees that the sequence has a single end-of-string marker '$', as its last character.
+        Each row in the matrix represents a rotation of the original sequence, taken as a single slice of the sequence
+        concatenated with itself. With a single trailing '$' no suffix is a prefix of another, so rotations compare
+        like their suffixes and the rows are already in lexicographical order when taken in suffix array order.
+        Encoded instances, whose '$' can be anywhere, fall back to sorting the rotations.
 
         Parameters:
         -------------
@@ -70,89 +187,70 @@ class BWT:
         ---------
         list[str]:
             A sorted matrix of strings representing all rotations of the original sequence.
-        
-        Raises:
-        ---------
-        AssertionError:
-            If the input sequence is not a string.
         """
-        
-        assert isinstance(self.seq_original,str),"The input sequence must be a string"
-
-        if self.seq_original.find('$') == -1:
-            self.seq_original = self.seq_original + '$'
-        
-        seq = self.seq_original
-        matriz = []
 
-        for _ in range(len(seq)):
+        n = len(self.seq_original)
+        duplicada = self.seq_original + self.seq_original
 
-            matriz.append(seq)
-            seq = seq[-1] + seq[:len(seq)-1]
+        if self.encoded: return sorted([duplicada[i:i + n] for i in range(n)])
 
-        return sorted(matriz)
+        return [duplicada[i:i + n] for i in self.sa]
 
 
     def construir_BWT(self) -> str:
         """
         Constructs the Burrows-Wheeler Transformed (BWT) of the original sequence.
+        Since the sequence ends with '$', the row i of the sorted rotation matrix starts at position sa[i],
+        so its last character is the one preceding that suffix. The rotation matrix is never built.
+        Encoded instances have no suffix array, so their BWT is read from the last column of the sorted matrix.
 
         Parameters:
         -------------
         self (BWT): 
-            An instance of the BWT class. The sorted roation matrix is stored in self.matrix_ord.
+            An instance of the BWT class. The suffix array of the original sequence is stored in self.sa.
 
         Returns:
         ---------
         str:
             A string representing the Burrows-Wheeler Transformed (BWT) of the original sequence.
-            The BWT is constructed by concatenating the last characters of each row in the sorted matrix.
+            The BWT is constructed by taking seq[(sa[i]-1) mod n] for each entry of the suffix array.
         """
 
-        return "".join([linha[-1] for linha in self.matrix_ord])
+        if self.encoded: return "".join([linha[-1] for linha in self.matriz_ordenada()])
+
+        seq = self.seq_original
+
+        return "".join([seq[i - 1] for i in self.sa])
 
 
-    def ocorrencias(self,seq:str)->list[str]:
+    def _codificar(self) -> tuple[list[str], dict[str, int], bytes]:
         """
-        Counts the occurrences of each character in the given sequence and returns a list of strings.
-        Each string in the list represents a character followed by its count, with leading zeros added if necessary.
+        Packs the alphabet of the BWT into codes 0..sigma-1, in lexicographical order, and encodes the BWT as bytes of codes.
+        Indexing the result yields small ints, so the hot loops never allocate one-character strings nor hash them.
 
         Parameters:
-        -------------
-        seq (str): 
-            The sequence for which the occurrences will be counted.
+        -----------
+        self (BWT): An instance of the BWT class. The bwt is stored in self.bwt.
 
         Returns:
-        ---------
-        list[str]:
-            A list of strings representing the occurrences of each character in the sequence.
+        --------
+        tuple[list[str], dict[str, int], bytes]: 
+            The sorted alphabet, the code of each character and the BWT encoded as codes.
         """
-        assert len(seq) != 0, "The input sequence must be non-empty."
-        maximo = len(str(max([seq.count(elem) for elem in set(seq)])))
-        counts = {elem:0 for elem in set(seq)}
-        res = []
-
-        for elem in seq:
-            counts[elem] += 1
-
-            if len(str(counts[elem])) != maximo and len(str(counts[elem]))==1:
-                zeros = "0"*(maximo-len(str(counts[elem])))
-                res.append(elem+zeros+str(counts[elem]))
-            
-            elif len(str(counts[elem])) != maximo and len(str(counts[elem]))>1:
-                zeros = "0"*(maximo-len(str(counts[elem])))
-                res.append(elem+ str(counts[elem])+zeros)
-            
-            else: res.append(elem+str(counts[elem]))
-        
-        return res
-        
-               
+
+        simbolos = sorted(set(self.bwt))
+        codigos = {char: c for c, char in enumerate(simbolos)}
+
+        return simbolos, codigos, bytes(map(codigos.__getitem__, self.bwt))
+
+
     def obter_seq_original(self) -> str:
 
         """
         This method is used to obtain the original sequence from the Burrows-Wheeler Transformed (BWT).
-        It uses the occurrence counts of characters in the first and last columns of the sorted matrix.
+        It walks the LF mapping backwards from the row that starts with '$': LF(i) = C[bwt[i]] + rank(i),
+        where C[c] is the number of characters smaller than c in the BWT and rank(i) the number of
+        occurrences of bwt[i] in bwt[:i]. The walk is iterative and runs in O(n).
 
         Parameters:
         -----------
@@ -163,33 +261,35 @@ class BWT:
         str: The original sequence obtained from the BWT.
 
         """
-        
-        first_col_count = self.ocorrencias(sorted(self.bwt))
-        last_col_counts = self.ocorrencias(self.bwt)
-
-        for string in last_col_counts:
-            match = re.search(r'^[$\d]+', string)
-            
-            if match != None:
-                idx = last_col_counts.index(string)
-                elem_stop = last_col_counts[idx]
-                break
-        
-        res = ""
 
-        while first_col_count[idx] != elem_stop:
-            elem = re.findall(r'^[\w]', first_col_count[idx])
-            if len(elem) != 0:
-                res = res + elem[0]
-            idx = last_col_counts.index(first_col_count[idx])
-        
-        return res
+        simbolos, codigos, bwt_codigos = self._codificar()
+
+        contagens = [0] * len(simbolos)
+        rank = []
+        for c in bwt_codigos:
+            rank.append(contagens[c])
+            contagens[c] += 1
+
+        primeira_ocorrencia = list(accumulate(contagens, initial=0))
+        lf = [primeira_ocorrencia[c] + r for c, r in zip(bwt_codigos, rank)]
+
+        idx = primeira_ocorrencia[codigos['$']]
+        res = bytearray()
+        for _ in range(len(bwt_codigos) - 1):
+            res.append(bwt_codigos[idx])
+            idx = lf[idx]
+        res.reverse()
+
+        return "".join(map(simbolos.__getitem__, res))
 
 
     def suffix_array(self, seq : str) -> list[int]:
         """
         Computes the suffix array of a given string. The suffix array is a sorted array of all suffixes of the input string.
         Each suffix is represented by its starting index in the original string.
+        It uses prefix doubling: the suffixes are first sorted by their first _PREFIXO characters, which resolves almost
+        every pair on random text with a single short string comparison, and then by their first k characters using the
+        ranks of the previous round, doubling k until all ranks are distinct. No suffix is ever copied, so it runs in O(n log² n).
 
         Parameters:
         -----------
@@ -203,15 +303,86 @@ class BWT:
             The suffixes are sorted in lexicographical order.
         """
 
-        suffix_array = sorted(range(len(seq)), key=lambda i: seq[i:])
+        n = len(seq)
+        if n == 0: return []
+
+        prefixos = [seq[i:i + _PREFIXO] for i in range(n)]
+        suffix_array = sorted(range(n), key=prefixos.__getitem__)
+        rank = _ranks(suffix_array, prefixos)
+        del prefixos
+        k = _PREFIXO
+
+        while rank[suffix_array[-1]] != n - 1:
+            chaves = list(zip(rank, rank[k:] + [-1] * k))
+            suffix_array.sort(key=chaves.__getitem__)
+            rank = _ranks(suffix_array, chaves)
+            k *= 2
 
         return suffix_array
 
     
+    def _tabela_rank(self, bwt_codigos : bytes, sigma : int) -> list[list[int]]:
+        """
+        Builds the sampled rank table of the BWT: for each code c, count[c][k] is the number of occurrences of c in bwt[:k*_BLOCO].
+        Only one rank every _BLOCO positions is stored, so the table takes O(n/_BLOCO * sigma) memory instead of O(n * sigma);
+        the ranks in between are recovered by counting inside the block (see _fm_search).
+
+        Parameters:
+        -----------
+        bwt_codigos (bytes): 
+            The BWT with each character replaced by its code in [0, sigma).
+
+        sigma (int): 
+            The size of the alphabet of the BWT.
+
+        Returns:
+        --------
+        list[list[int]]: 
+            A list indexed by code with ceil(len(bwt) / _BLOCO) + 1 cumulative counts per code.
+        """
+
+        blocos = [bwt_codigos[k:k + _BLOCO] for k in range(0, len(bwt_codigos), _BLOCO)]
+
+        return [list(accumulate((bloco.count(c) for bloco in blocos), initial=0)) for c in range(sigma)]
+
+
+    def _construir_indice(self) -> tuple[dict[str, int], list[list[int]], bytes, list[int]]:
+        """
+        Builds the FM-index tables of the BWT once and caches them in self._indice, so that successive searches
+        only pay for the backward search. For encoded instances the suffix array of the decoded sequence is kept in the
+        cache only, so self.sa keeps meaning the suffix array of seq_original.
+        The alphabet of the BWT is packed into codes 0..sigma-1 (in lexicographical order), so every table is a list indexed by code.
+        The first occurrence of each code is the prefix sum of the character histogram, read from the last checkpoint of the rank table,
+        and is folded into the checkpoints at build time so the backward search reads the LF mapping with a single lookup.
+
+        Parameters:
+        -----------
+        self (BWT): An instance of the BWT class. The bwt is stored in self.bwt.
+
+        Returns:
+        --------
+        tuple[dict[str, int], list[list[int]], bytes, list[int]]: 
+            The code of each character, the sampled LF table, the BWT encoded as codes and the suffix array of the original sequence.
+        """
+
+        if self._indice is None:
+            if self.encoded: sa = self.suffix_array(self.obter_seq_original() + '$')
+            else: sa = self.sa
+
+            simbolos, codigos, bwt_codigos = self._codificar()
+            count = self._tabela_rank(bwt_codigos, len(simbolos))
+            first_occurrence = accumulate((checkpoints[-1] for checkpoints in count), initial=0)
+            lf_amostrado = [[c + rank for rank in checkpoints] for c, checkpoints in zip(first_occurrence, count)]
+
+            self._indice = (codigos, lf_amostrado, bwt_codigos, sa)
+
+        return self._indice
+
+
     def procuraPadraoBWT(self, pattern : str) -> list[int]:
         """
         This method is used to find the positions of a pattern in the original sequence using the Burrows-Wheeler Transform (BWT).
-        It implements the Boyer-Moore algorithm for string matching in the BWT.
+        It performs a backward search over the FM-index tables, which are built on the first call and reused afterwards.
 
         Parameters:
         -----------
@@ -224,35 +395,40 @@ class BWT:
             A list of positions where the pattern is found in the original sequence. If the pattern is not found, an empty list is returned.
         """
 
-        sorted_bwt = sorted(self.bwt)
-        suffix_array = self.suffix_array(self.seq_original)
-        
-        count = {char: [0] * (len(self.bwt) + 1) for char in set(self.bwt)}
-        for i in range(1, len(self.bwt) + 1):
-            for char in count:
-                count[char][i] = count[char][i - 1]
-            count[self.bwt[i - 1]][i] += 1
-
-        first_occurrence = {}
-        for i, char in enumerate(sorted_bwt):
-            if char not in first_occurrence:
-                first_occurrence[char] = i
-
-        top = 0
-        bottom = len(self.bwt) - 1
-        while top <= bottom:
-            if pattern:
-                symbol = pattern[-1]
-                pattern = pattern[:-1]
-                if count[symbol][bottom + 1] > count[symbol][top]:
-                    top = first_occurrence[symbol] + count[symbol][top]
-                    bottom = first_occurrence[symbol] + count[symbol][bottom + 1] - 1
-                else:
-                    return []
-            else:
-                return sorted([suffix_array[i] for i in range(top, bottom + 1)])
-
-        return []
+        codigos, lf_amostrado, bwt_codigos, sa = self._construir_indice()
+
+        try: padrao = bytes(map(codigos.__getitem__, pattern))
+        except KeyError: return []
+
+        top, bottom = _fm_search(padrao, lf_amostrado, bwt_codigos)
+
+        posicoes = sa[top:bottom + 1]
+        posicoes.sort()
+
+        return posicoes
+
+
+    def procuraPadraoBWTBatch(self, patterns : list[str]) -> list[list[int]]:
+        """
+        This method is used to find the positions of several patterns in the original sequence using the Burrows-Wheeler Transform (BWT).
+        The FM-index tables are built at most once for the whole batch and repeated patterns are searched only once.
+
+        Parameters:
+        -----------
+        patterns (list[str]): 
+            The patterns to be searched in the original sequence.
+
+        Returns:
+        --------
+        list[list[int]]: 
+            For each pattern, in the same order, the list of positions where it is found in the original sequence.
+        """
+
+        resultados = {}
+        for pattern in patterns:
+            if pattern not in resultados: resultados[pattern] = self.procuraPadraoBWT(pattern)
+
+        return [list(resultados[pattern]) for pattern in patterns]
     
 
 if __name__ == "__main__":
@@ -266,9 +442,6 @@ if __name__ == "__main__":
     print(f"\nDecoding BWT: {bwt}")
     print(BWT(bwt,encoded=True).obter_seq_original())
 
-    print("\nOcorrence of each element in the BWT:")
-    print(BWT("AAAAAAAAAAAAAAAAAAAAABBBCD$",encoded=True).ocorrencias("AAAAAAAAAAAAAAAAAAAAABBBCD$"))
-
     print("\nRestoring the original sequence after being encoded")
     print(BWT(seq,encoded=False).obter_seq_original())
 
@@ -279,12 +452,3 @@ if __name__ == "__main__":
     pattern = "T"
     print(f"\nFinding the position of the pattern {pattern} on sequence {seq}")
     print(BWT(seq).procuraPadraoBWT(pattern))
-    
-
-    print("Metricas de Codigo:")
-    print("\nMetrica cyclomatic complexity:")
-    print(subprocess.call(["radon","cc","BWT/BWT_final.py", "-s"]))
-    print("\nMetrica maintainability index:")
-    print(subprocess.call(["radon","mi","BWT/BWT_final.py", "-s"]))
-    print("\nMetrica raw:")
-    print(subprocess.call(["radon","raw","BWT/BWT_final.py", "-s"]))
\ No newline at end of file
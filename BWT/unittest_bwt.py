@@ -1,4 +1,5 @@
 import unittest
+import random
 from BWT import BWT
 
 
@@ -22,14 +23,7 @@ class TestBWT(unittest.TestCase):
                               "rinolaringologista$otor", "rrinolaringologista$oto", "sta$otorrinolaringologi",
                               "ta$otorrinolaringologis", "torrinolaringologista$o"]
                             ]
-        self.bwt_expected = ["ipssm$pissii", "annb$aa", "otrnnaag$goo", "atlonrrgooiilngt$aroiso"]  
-
-        self.bwt = ["A$", "ABCD$", "AAABBBCCC$","ABCDABCD$", "AAAAAAAAAAAAAAAAAAAAABBBCD$"]
-        self.occ = [["A1", "$1"], ["A1", "B1", "C1", "D1", "$1"], ['A1', 'A2', 'A3', 'B1', 'B2', 'B3',
-                    'C1', 'C2', 'C3', '$1'],['A1', 'B1', 'C1', 'D1', 'A2', 'B2', 'C2', 'D2', '$1'],
-                    ['A01', 'A02', 'A03', 'A04', 'A05', 'A06', 'A07', 'A08', 'A09', 'A10', 'A11',
-                     'A12', 'A13', 'A14', 'A15', 'A16', 'A17', 'A18', 'A19', 'A20', 'A21', 'B01',
-                     'B02', 'B03', 'C01', 'D01', '$01']]
+        self.bwt_expected = ["ipssm$pissii", "annb$aa", "otrnnaag$goo", "atlonrrgooiilngt$aroiso"]
 
 
     def test_sorted_matrix(self):
@@ -39,16 +33,47 @@ class TestBWT(unittest.TestCase):
                              f"The {seq_to_encode} should be sorted as {sorted_matrix} insted of {BWT(seq_to_encode).matriz_ordenada()}")
 
     
+    def test_sorted_matrix_matches_sorted_rotations(self):
+        for seq in ["TAGACAGAGA", "A B!A#B", "AAAA", "", "BWT$"]:
+            classe = BWT(seq)
+            seq = classe.seq_original
+            expected = sorted([seq[i:] + seq[:i] for i in range(len(seq))])
+            self.assertEqual(classe.matriz_ordenada(),expected,
+                             f"The {seq} should be sorted as {expected} insted of {classe.matriz_ordenada()}")
+
+    
     def test_construirBWT(self):
         for seq_to_encode,bwt in zip(self.seqs_to_encode,self.bwt_expected):
             self.assertEqual(BWT(seq_to_encode).construir_BWT(),bwt,
                              f"The {seq_to_encode} should be encoded to {bwt} insted of {BWT(seq_to_encode).construir_BWT()}")
 
 
-    def test_ocorrências(self):
-        for bwt,occ in zip(self.bwt,self.occ):
-            self.assertEqual(BWT(bwt,encoded=True).ocorrencias(bwt),occ,
-                             f"The {bwt} should have the folliwing ocorrences to {occ} insted of {BWT(bwt,encoded=True).ocorrencias(bwt)}")
+    def test_construirBWT_matches_sorted_matrix(self):
+        for seq_to_encode in self.seqs_to_encode + ["TAGACAGAGA$", "ACGTTGCAACGTACGT"]:
+            classe = BWT(seq_to_encode)
+            expected = "".join([linha[-1] for linha in classe.matriz_ordenada()])
+            self.assertEqual(classe.construir_BWT(),expected,
+                             f"The {seq_to_encode} should be encoded to {expected} insted of {classe.construir_BWT()}")
+
+        classe = BWT("AGGGTCAAAA$", encoded=True)
+        self.assertEqual(classe.construir_BWT(),"AAAAC$TAGGG",
+                         f"The AGGGTCAAAA$ should be encoded to AAAAC$TAGGG insted of {classe.construir_BWT()}")
+
+
+    def test_marker_not_at_the_end(self):
+        for seq in ["AB$AA", "$AB", "AB$$"]:
+            with self.assertRaises(AssertionError, msg=f"The sequence {seq} should be rejected"):
+                BWT(seq)
+
+
+    def test_alphabet_too_large(self):
+        seq = "".join([chr(0x100 + i) for i in range(300)])
+
+        for encoded in [False, True]:
+            with self.assertRaises(AssertionError, msg="A sequence with 300 distinct characters should be rejected"):
+                BWT(seq, encoded=encoded)
+
+        self.assertEqual(BWT(seq[:255]).procuraPadraoBWT(seq[10:13]),[10])
 
 
     def test_obterSequenciaOriginal(self):
@@ -65,6 +90,13 @@ class TestBWT(unittest.TestCase):
                              f"The sequence {seq} should have the suffix array {exp} insted of {BWT(seq).suffix_array(seq)}")
 
 
+    def test_suffix_array_matches_sorted_suffixes(self):
+        for seq in self.seqs_to_encode + ["TAGACAGAGA$", "AAAAAAAAAAAAAAAAAAAAABBBCD$", "ACACACACAC"]:
+            expected = sorted(range(len(seq)), key=lambda i: seq[i:])
+            self.assertEqual(BWT(seq).suffix_array(seq), expected,
+                             f"The sequence {seq} should have the suffix array {expected} insted of {BWT(seq).suffix_array(seq)}")
+
+
     def test_pattern(self):
         seq = "TAGACAGAGA$"
         patterns =["AGA", "T", "A", "TAG", "GACAG"]
@@ -78,5 +110,78 @@ class TestBWT(unittest.TestCase):
                              f"The pattern {pattern} should have the following results {exp_result} insted of {classe.procuraPadraoBWT(pattern)}")
 
 
+    def test_pattern_batch(self):
+        seq = "TAGACAGAGA$"
+        patterns = ["AGA", "T", "A", "TAG", "GACAG", "N", "AGA"]
+        expected_results = [[1,5,7],[0], [1, 3, 5, 7, 9], [0], [2], [], [1,5,7]]
+
+        self.assertEqual(BWT(seq).procuraPadraoBWTBatch(patterns),expected_results,
+                         f"The patterns {patterns} should have the following results {expected_results} insted of {BWT(seq).procuraPadraoBWTBatch(patterns)}")
+
+
+    def test_pattern_across_blocks(self):
+        rng = random.Random(0)
+        aleatoria = "".join(rng.choice("ACGT") for _ in range(300))
+        seqs = ["ACGT" * 40, "ACGT" * 32, "A" * 127, "ACGT" * 16 + aleatoria, aleatoria[:255]]
+        patterns = ["A", "C", "ACG", "GTAC", "AAAA", "TTG", "ACGTACGTACGT", "CGTAA"]
+
+        for seq in seqs:
+            classe = BWT(seq)
+            texto = classe.seq_original
+            for pattern in patterns:
+                expected = []
+                i = texto.find(pattern)
+                while i != -1:
+                    expected.append(i)
+                    i = texto.find(pattern, i + 1)
+
+                self.assertEqual(classe.procuraPadraoBWT(pattern),expected,
+                                 f"The pattern {pattern} should have the following results {expected} insted of {classe.procuraPadraoBWT(pattern)}")
+
+
+    def test_pattern_not_found(self):
+        classe = BWT("TAGACAGAGA$")
+
+        for pattern in ["TT", "N", "AGAN", "CAGAT"]:
+            self.assertEqual(classe.procuraPadraoBWT(pattern),[],
+                             f"The pattern {pattern} should not be found insted of {classe.procuraPadraoBWT(pattern)}")
+
+
+    def test_pattern_encoded(self):
+        classe = BWT("AGGGTCAAAA$", encoded=True)
+
+        self.assertEqual(classe.procuraPadraoBWT("AGA"),[1,5,7],
+                         f"The pattern AGA should have the following results [1, 5, 7] insted of {classe.procuraPadraoBWT('AGA')}")
+
+
+    def test_sorted_matrix_encoded_after_search(self):
+        classe = BWT("AGGGTCAAAA$", encoded=True)
+        expected = classe.matriz_ordenada()
+        classe.procuraPadraoBWT("AGA")
+
+        self.assertEqual(classe.matriz_ordenada(),expected,
+                         f"The matrix should be {expected} insted of {classe.matriz_ordenada()}")
+
+
+    def test_construirBWT_encoded_after_search(self):
+        classe = BWT("AGGGTCAAAA$", encoded=True)
+        expected = classe.construir_BWT()
+        classe.procuraPadraoBWT("AGA")
+
+        self.assertIsNone(classe.sa)
+        self.assertEqual(classe.construir_BWT(),expected,
+                         f"The BWT should be {expected} insted of {classe.construir_BWT()}")
+
+
+    def test_pattern_after_reassigning_sequence(self):
+        classe = BWT("TAGACAGAGA$")
+        self.assertEqual(classe.procuraPadraoBWT("AGA"),[1,5,7])
+
+        classe.seq_original = "GATTACA"
+        self.assertEqual(classe.bwt,"ACTGA$TA")
+        self.assertEqual(classe.procuraPadraoBWT("A"),[1,4,6],
+                         f"The pattern A should have the following results [1, 4, 6] insted of {classe.procuraPadraoBWT('A')}")
+
+
 if __name__ == '__main__':
     unittest.main(argv=[''], exit=False)
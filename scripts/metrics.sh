@@ -0,0 +1,13 @@
+#!/bin/sh
+# Metricas de codigo (radon) para os modulos indicados; por omissao BWT/BWT.py.
+# Uso: scripts/metrics.sh [ficheiro.py ...]
+
+[ $# -eq 0 ] && set -- BWT/BWT.py
+
+echo "Metricas de Codigo:"
+printf "\nMetrica cyclomatic complexity:\n"
+radon cc "$@" -s
+printf "\nMetrica maintainability index:\n"
+radon mi "$@" -s
+printf "\nMetrica raw:\n"
+radon raw "$@" -s